@@ -0,0 +1,15 @@
+# scripts/_paths.py
+"""Shared project paths, resolved once at import time.
+
+The layout is fixed — scripts/ sits directly under the project root — so
+there is no need for every script to re-walk parent directories looking
+for config/ and data/ on startup. Import the constants instead.
+"""
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+CONFIG_DIR = ROOT / "config"
+DATA_DIR = ROOT / "data"
+RAW_DIR = DATA_DIR / "raw"
+CLEAN_DIR = DATA_DIR / "cleaned"
+LOGS_DIR = ROOT / "logs"
@@ -1,164 +1,259 @@
-# scripts/clean_ticket_sales.py
-from pathlib import Path
-import logging
-import pandas as pd
-import yaml
-from typing import Dict, Any, List
-
-# ---------- utilities ----------
-def find_project_root(start: Path) -> Path:
-    p = start.resolve()
-    for parent in [p] + list(p.parents):
-        if (parent / "config").exists() and (parent / "data").exists():
-            return parent
-    return start.parent
-
-def load_yaml(path: Path) -> Dict[str, Any]:
-    with open(path, "r", encoding="utf-8") as f:
-        return yaml.safe_load(f)
-
-def setup_logging(log_file: Path):
-    log_file.parent.mkdir(parents=True, exist_ok=True)
-    logging.basicConfig(
-        level=logging.INFO,
-        format="%(asctime)s | %(levelname)s | %(message)s",
-        handlers=[logging.FileHandler(log_file, encoding="utf-8"), logging.StreamHandler()],
-    )
-
-def normalize_cols(df: pd.DataFrame) -> pd.DataFrame:
-    df.columns = (
-        df.columns
-          .str.strip()
-          .str.lower()
-          .str.replace(" ", "_", regex=False)
-    )
-    return df
-
-def norm_section(s: pd.Series) -> pd.Series:
-    return (s.astype(str)
-              .str.strip()
-              .str.replace(r"\s+", " ", regex=True)
-              .str.title())
-
-# ---------- main ----------
-def main():
-    ROOT = find_project_root(Path(__file__).resolve())
-    LOG_FILE  = ROOT / "logs" / "clean_ticket_sales.log"
-    setup_logging(LOG_FILE)
-
-    # Load markets.yml (authoritative list of venues/markets)
-    try:
-        mk = load_yaml(ROOT / "config" / "markets.yml")
-        MARKETS: List[Dict[str, Any]] = mk.get("markets", []) if isinstance(mk, dict) else []
-    except FileNotFoundError:
-        MARKETS = []
-    if not MARKETS:
-        logging.error("No markets found in config/markets.yml")
-        return
-
-    # Paths
-    raw_tickets   = ROOT / "data" / "raw" / "pwhl_ticket_sales.csv"
-    capacity_path = ROOT / "data" / "raw" / "game_section_capacity.csv"
-    clean_dir     = ROOT / "data" / "cleaned"
-
-    logging.info("Project root: %s", ROOT)
-    logging.info("Expecting raw ticket sales at: %s", raw_tickets)
-
-    if not raw_tickets.exists():
-        logging.error("Raw ticket sales file not found: %s", raw_tickets)
-        return
-    if not capacity_path.exists():
-        logging.error("Capacity file not found: %s", capacity_path)
-        return
-
-    # Load tickets
-    df = pd.read_csv(raw_tickets)
-    normalize_cols(df)
-    logging.info("Loaded raw ticket sales: %s (%d rows, %d cols)", raw_tickets, len(df), df.shape[1])
-
-    # Validate expected ticket columns
-    expected = {
-        "event_date", "section", "row", "seat",
-        "ticket_price", "purchase_channel", "acct_id",
-        "num_tickets", "total_spend"
-    }
-    missing = expected.difference(df.columns)
-    if missing:
-        logging.error("Missing columns in ticket sales: %s", ", ".join(sorted(missing)))
-        return
-
-    # Parse/clean ticket types
-    df["event_date"] = pd.to_datetime(df["event_date"], errors="coerce").dt.date
-    df["section"] = norm_section(df["section"])
-    df["purchase_channel"] = df["purchase_channel"].astype(str).str.strip()
-    for c in ["row", "seat", "ticket_price", "num_tickets", "total_spend"]:
-        df[c] = pd.to_numeric(df[c], errors="coerce")
-
-    # Integrity check
-    calc_spend = (df["ticket_price"] * df["num_tickets"]).round(2)
-    mismatch = (df["total_spend"].round(2) != calc_spend)
-    if mismatch.any():
-        logging.warning("Found %d rows where total_spend != ticket_price * num_tickets", int(mismatch.sum()))
-
-    # Load capacity (section capacities per event_date, section)
-    cap = pd.read_csv(capacity_path)
-    normalize_cols(cap)
-    req_cap = {"event_date", "section", "section_capacity"}
-    miss_cap = req_cap.difference(cap.columns)
-    if miss_cap:
-        logging.error("Capacity file missing columns: %s", ", ".join(sorted(miss_cap)))
-        return
-
-    cap["event_date"] = pd.to_datetime(cap["event_date"], errors="coerce").dt.date
-    cap["section"] = norm_section(cap["section"])
-
-    # Ensure uniqueness on capacity join keys (event_date, section)
-    dupes = cap.duplicated(subset=["event_date", "section"], keep=False)
-    if dupes.any():
-        logging.error("Duplicate keys in capacity for (event_date, section). Sample:\n%s",
-                      cap.loc[dupes, ["event_date", "section"]].head(10))
-        return
-
-    # Merge tickets with capacity once (base frame)
-    base = df.merge(
-        cap[["event_date", "section", "section_capacity"]],
-        on=["event_date", "section"],
-        how="left",
-        validate="m:1"
-    )
-
-    # Loop over all markets and stamp venue_id/market/venue
-    clean_dir.mkdir(parents=True, exist_ok=True)
-    outputs = []
-    for m in MARKETS:
-        venue_id = str(m.get("venue_id", "")).strip()
-        market   = str(m.get("market", "")).strip()
-        venue    = str(m.get("venue", "")).strip()
-        if not venue_id or not market or not venue:
-            logging.warning("Skipping malformed market entry: %s", m)
-            continue
-
-        logging.info("Processing market: %s (%s)", market, venue_id)
-        df_m = base.copy()
-        df_m["venue_id"] = venue_id
-        df_m["market"]   = market
-        df_m["venue"]    = venue
-
-        out = clean_dir / f"ticket_sales_clean_{venue_id}.csv"
-        df_m.to_csv(out, index=False)
-        outputs.append(out)
-        logging.info("Saved: %s (%d rows)", out, len(df_m))
-
-    # Optional: write a combined file with all markets
-    if outputs:
-        combined = pd.concat([pd.read_csv(p) for p in outputs], ignore_index=True)
-        combined_out = clean_dir / "ticket_sales_clean_all_markets.csv"
-        combined.to_csv(combined_out, index=False)
-        logging.info("Saved combined all-markets file: %s (%d rows)", combined_out, len(combined))
-    else:
-        logging.error("No market files were produced. Check markets.yml format.")
-
-if __name__ == "__main__":
-    main()
-    
+# scripts/clean_ticket_sales.py
+from pathlib import Path
+import functools
+import logging
+from logging.handlers import RotatingFileHandler, MemoryHandler
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from pyarrow import csv as pacsv
+import yaml
+from typing import Dict, Any, List
+
+from _paths import ROOT, CONFIG_DIR, RAW_DIR, CLEAN_DIR, LOGS_DIR
+
+# ---------- utilities ----------
+try:
+    from yaml import CSafeLoader as _YamlLoader  # LibYAML C bindings when built
+except ImportError:
+    from yaml import SafeLoader as _YamlLoader
+
+@functools.lru_cache(maxsize=8)
+def _load_yaml_cached(path_str: str, mtime: float) -> Dict[str, Any]:
+    with open(path_str, "r", encoding="utf-8") as f:
+        return yaml.load(f, Loader=_YamlLoader)
+
+def load_yaml(path: Path) -> Dict[str, Any]:
+    # Keyed on path + mtime so repeat loads in one pipeline run hit the cache
+    # but edits to the file still invalidate it.
+    return _load_yaml_cached(str(path), path.stat().st_mtime)
+
+def setup_logging(log_file: Path):
+    log_file.parent.mkdir(parents=True, exist_ok=True)
+    # The rotating file handler opens lazily (delay=True) and sits behind a
+    # MemoryHandler, so INFO records flush to disk in batches instead of per
+    # record; errors flush immediately.
+    file_handler = RotatingFileHandler(
+        log_file, maxBytes=5_000_000, backupCount=3, encoding="utf-8", delay=True
+    )
+    file_handler.setFormatter(logging.Formatter("%(asctime)s | %(levelname)s | %(message)s"))
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s | %(levelname)s | %(message)s",
+        force=True,
+        handlers=[
+            MemoryHandler(1024, flushLevel=logging.ERROR, target=file_handler),
+            logging.StreamHandler(),
+        ],
+    )
+
+def normalize_cols(df: pd.DataFrame) -> pd.DataFrame:
+    df.columns = (
+        df.columns
+          .str.strip()
+          .str.lower()
+          .str.replace(" ", "_", regex=False)
+    )
+    return df
+
+def norm_section(s: pd.Series) -> pd.Series:
+    # Section names are low-cardinality, so run the string pipeline once per
+    # unique value and broadcast back through the categorical codes instead
+    # of regex-scanning every row.
+    cats = pd.Categorical(s.astype(str))
+    normalized = (
+        pd.Index(cats.categories)
+          .str.strip()
+          .str.replace(r"\s+", " ", regex=True)
+          .str.title()
+          .to_numpy()
+    )
+    return pd.Series(normalized[cats.codes], index=s.index)
+
+# ---------- main ----------
+def main():
+    LOG_FILE  = LOGS_DIR / "clean_ticket_sales.log"
+    setup_logging(LOG_FILE)
+
+    # Load markets.yml (authoritative list of venues/markets)
+    try:
+        mk = load_yaml(CONFIG_DIR / "markets.yml")
+        MARKETS: List[Dict[str, Any]] = mk.get("markets", []) if isinstance(mk, dict) else []
+    except FileNotFoundError:
+        MARKETS = []
+    if not MARKETS:
+        logging.error("No markets found in config/markets.yml")
+        return
+
+    # Paths
+    raw_tickets   = RAW_DIR / "pwhl_ticket_sales.csv"
+    capacity_path = RAW_DIR / "game_section_capacity.csv"
+    clean_dir     = CLEAN_DIR
+
+    logging.info("Project root: %s", ROOT)
+    logging.info("Expecting raw ticket sales at: %s", raw_tickets)
+
+    if not raw_tickets.exists():
+        logging.error("Raw ticket sales file not found: %s", raw_tickets)
+        return
+    if not capacity_path.exists():
+        logging.error("Capacity file not found: %s", capacity_path)
+        return
+
+    # Markets frame (authoritative venue_id/market/venue per row)
+    mkt_df = pd.DataFrame([
+        {
+            "venue_id": str(m.get("venue_id", "")).strip(),
+            "market":   str(m.get("market", "")).strip(),
+            "venue":    str(m.get("venue", "")).strip(),
+        }
+        for m in MARKETS
+    ])
+    malformed = (mkt_df == "").any(axis=1)
+    if malformed.any():
+        for _, row in mkt_df[malformed].iterrows():
+            logging.warning("Skipping malformed market entry: %s", row.to_dict())
+        mkt_df = mkt_df[~malformed].reset_index(drop=True)
+
+    if mkt_df.empty:
+        logging.error("No market files were produced. Check markets.yml format.")
+        return
+    n_mkt = len(mkt_df)
+
+    # Load capacity (section capacities per event_date, section)
+    cap = pd.read_csv(capacity_path)
+    normalize_cols(cap)
+    req_cap = {"event_date", "section", "section_capacity"}
+    miss_cap = req_cap.difference(cap.columns)
+    if miss_cap:
+        logging.error("Capacity file missing columns: %s", ", ".join(sorted(miss_cap)))
+        return
+
+    cap["event_date"] = pd.to_datetime(cap["event_date"], errors="coerce").dt.date
+    cap["section"] = norm_section(cap["section"])
+
+    # Ensure uniqueness on capacity join keys (event_date, section)
+    dupes = cap.duplicated(subset=["event_date", "section"], keep=False)
+    if dupes.any():
+        logging.error("Duplicate keys in capacity for (event_date, section). Sample:\n%s",
+                      cap.loc[dupes, ["event_date", "section"]].head(10))
+        return
+    cap_idx = cap.set_index(["event_date", "section"])["section_capacity"]
+
+    # Stream the raw tickets in Arrow record batches instead of loading the
+    # whole file: each batch is cleaned, joined to capacity, replicated per
+    # market and appended to the parquet outputs, so peak memory is O(batch)
+    # rather than O(file). event_date stays text in the reader — the raw file
+    # uses M/D/Y, which pd.to_datetime handles per batch; Arrow's date32
+    # parser only accepts ISO.
+    reader = pacsv.open_csv(
+        raw_tickets,
+        read_options=pacsv.ReadOptions(block_size=16 << 20),
+        convert_options=pacsv.ConvertOptions(
+            column_types={
+                "row": pa.int32(),
+                "seat": pa.int32(),
+                "ticket_price": pa.float64(),
+                "num_tickets": pa.int32(),
+                "total_spend": pa.float64(),
+            }
+        ),
+    )
+
+    expected = {
+        "event_date", "section", "row", "seat",
+        "ticket_price", "purchase_channel", "acct_id",
+        "num_tickets", "total_spend"
+    }
+
+    clean_dir.mkdir(parents=True, exist_ok=True)
+    combined_out = clean_dir / "ticket_sales_clean_all_markets.parquet"
+
+    combined_writer = None
+    venue_writers = {}
+    schema = None
+    raw_rows = 0
+    combined_rows = 0
+    mismatch_rows = 0
+
+    try:
+        for batch in reader:
+            chunk = batch.to_pandas()
+            normalize_cols(chunk)
+
+            if schema is None:
+                # Validate expected ticket columns on the first batch
+                missing = expected.difference(chunk.columns)
+                if missing:
+                    logging.error("Missing columns in ticket sales: %s", ", ".join(sorted(missing)))
+                    return
+
+            raw_rows += len(chunk)
+
+            # Parse/clean ticket types (numeric columns are already typed by Arrow)
+            chunk["event_date"] = pd.to_datetime(chunk["event_date"], errors="coerce").dt.date
+            chunk["section"] = norm_section(chunk["section"])
+            chunk["purchase_channel"] = chunk["purchase_channel"].astype(str).str.strip()
+
+            # Integrity check: tolerance comparison on the raw arrays instead
+            # of double-rounding two extra Series (half a cent absorbs any
+            # float representation noise).
+            tp = chunk["ticket_price"].to_numpy(dtype=np.float64, copy=False)
+            nt = chunk["num_tickets"].to_numpy(dtype=np.float64, copy=False)
+            ts = chunk["total_spend"].to_numpy(dtype=np.float64, copy=False)
+            mismatch_rows += int(np.count_nonzero(np.abs(tp * nt - ts) > 0.005))
+
+            # Join capacity on (event_date, section)
+            chunk = chunk.join(cap_idx, on=["event_date", "section"])
+
+            # Replicate per market: repeat the batch rows and stamp only a
+            # categorical venue_id. market/venue strings are 8x-redundant in
+            # the per-row outputs; consumers restore them by joining
+            # dim_market (materialize_dim_market.py) on venue_id.
+            replicated = chunk.loc[chunk.index.repeat(n_mkt)].reset_index(drop=True)
+            replicated["venue_id"] = pd.Categorical.from_codes(
+                np.tile(np.arange(n_mkt), len(chunk)), mkt_df["venue_id"]
+            )
+
+            if schema is None:
+                schema = pa.Table.from_pandas(replicated, preserve_index=False).schema
+                combined_writer = pq.ParquetWriter(combined_out, schema, compression="zstd")
+                for venue_id in mkt_df["venue_id"]:
+                    out = clean_dir / f"ticket_sales_clean_{venue_id}.parquet"
+                    venue_writers[venue_id] = pq.ParquetWriter(out, schema, compression="zstd")
+
+            combined_writer.write_table(
+                pa.Table.from_pandas(replicated, schema=schema, preserve_index=False)
+            )
+            combined_rows += len(replicated)
+
+            # Per-venue files for consumers that want a single market. After
+            # the repeat/tile, market i owns every n_mkt-th row of the batch.
+            for i, venue_id in enumerate(mkt_df["venue_id"]):
+                part = replicated.iloc[i::n_mkt]
+                venue_writers[venue_id].write_table(
+                    pa.Table.from_pandas(part, schema=schema, preserve_index=False)
+                )
+    finally:
+        if combined_writer is not None:
+            combined_writer.close()
+        for w in venue_writers.values():
+            w.close()
+
+    if combined_writer is None:
+        logging.error("No rows read from %s; nothing written.", raw_tickets)
+        return
+
+    logging.info("Loaded raw ticket sales: %s (%d rows)", raw_tickets, raw_rows)
+    if mismatch_rows:
+        logging.warning("Found %d rows where total_spend != ticket_price * num_tickets", mismatch_rows)
+
+    logging.info("Saved combined all-markets file: %s (%d rows)", combined_out, combined_rows)
+    for venue_id in mkt_df["venue_id"]:
+        logging.info("Saved: %s", clean_dir / f"ticket_sales_clean_{venue_id}.parquet")
+
+if __name__ == "__main__":
+    main()
+    
 # run with: python scripts\clean_ticket_sales.py
\ No newline at end of file
@@ -1,24 +1,46 @@
 ﻿# ingest_weather.py
+import functools
 import logging
+from logging.handlers import RotatingFileHandler, MemoryHandler
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
 import pandas as pd
 import requests
 import yaml
 from typing import Dict, Any
 
+from _paths import ROOT, CONFIG_DIR
+
+try:
+    from yaml import CSafeLoader as _YamlLoader  # LibYAML C bindings when built
+except ImportError:
+    from yaml import SafeLoader as _YamlLoader
+
+@functools.lru_cache(maxsize=8)
+def _load_yaml_cached(path_str: str, mtime: float) -> Dict[str, Any]:
+    with open(path_str, "r", encoding="utf-8") as f:
+        return yaml.load(f, Loader=_YamlLoader)
+
 def load_yaml(path: Path) -> Dict[str, Any]:
-    """Load a YAML config file."""
-    with open(path, "r", encoding="utf-8") as f:
-        return yaml.safe_load(f)
+    """Load a YAML config file (cached on path + mtime)."""
+    return _load_yaml_cached(str(path), path.stat().st_mtime)
 
 def setup_logging(log_file: Path):
     """Initialize logging with both file and console output."""
     log_file.parent.mkdir(parents=True, exist_ok=True)
+    # The rotating file handler opens lazily (delay=True) and sits behind a
+    # MemoryHandler, so INFO records flush to disk in batches instead of per
+    # record; errors flush immediately.
+    file_handler = RotatingFileHandler(
+        log_file, maxBytes=5_000_000, backupCount=3, encoding="utf-8", delay=True
+    )
+    file_handler.setFormatter(logging.Formatter("%(asctime)s | %(levelname)s | %(message)s"))
     logging.basicConfig(
         level=logging.INFO,
         format="%(asctime)s | %(levelname)s | %(message)s",
+        force=True,
         handlers=[
-            logging.FileHandler(log_file, encoding="utf-8"),
+            MemoryHandler(1024, flushLevel=logging.ERROR, target=file_handler),
             logging.StreamHandler(),
         ],
     )
@@ -32,6 +54,7 @@ def fetch_market_hourly(
     lon: float,
     tz: str,
     timeout: int,
+    session: requests.Session = None,
 ) -> pd.DataFrame:
     """Fetch hourly weather data for a single market."""
     params = {
@@ -42,16 +65,13 @@ def fetch_market_hourly(
         "hourly": hourly_vars,
         "timezone": tz,
     }
-    r = requests.get(base_url, params=params, timeout=timeout)
+    http = session if session is not None else requests
+    r = http.get(base_url, params=params, timeout=timeout)
     r.raise_for_status()
     j = r.json()
     return pd.DataFrame(j["hourly"])
 
 def main():
-    # --- Universal, portable path setup ---
-    ROOT = Path(__file__).resolve().parents[1]  # project root
-    CONFIG_DIR = ROOT / "config"
-
     # Load configuration
     settings = load_yaml(CONFIG_DIR / "settings.yml")
     markets_cfg = load_yaml(CONFIG_DIR / "markets.yml")
@@ -75,26 +95,44 @@ def main():
     if not markets or len(markets) < 8:
         logging.warning("Expected 8 markets; found %d. Proceeding anyway.", len(markets))
 
-    frames = []
-    for m in markets:
-        market = m["market"]
-        venue = m.get("venue", "")
-        lat = float(m["lat"])
-        lon = float(m["lon"])
-        tz = m["timezone"]
-
-        try:
-            logging.info(
-                "Fetching %s (%s) lat=%.4f lon=%.4f tz=%s",
-                market, venue, lat, lon, tz
-            )
-            df = fetch_market_hourly(base_url, hourly_vars, start, end, lat, lon, tz, timeout)
-            df["market"] = market
-            df["venue"] = venue
-            frames.append(df)
-            logging.info("Fetched %d rows for %s", len(df), market)
-        except Exception as e:
-            logging.exception("Failed for %s: %s", market, e)
+    # The per-market fetches are independent HTTP calls, so issue them
+    # concurrently: one thread per market (capped), sharing a single Session
+    # to amortize TCP/TLS setup.
+    results = {}
+    with requests.Session() as session:
+        with ThreadPoolExecutor(max_workers=min(16, max(1, len(markets)))) as ex:
+            futures = {}
+            for i, m in enumerate(markets):
+                market = m["market"]
+                venue = m.get("venue", "")
+                lat = float(m["lat"])
+                lon = float(m["lon"])
+                tz = m["timezone"]
+
+                logging.info(
+                    "Fetching %s (%s) lat=%.4f lon=%.4f tz=%s",
+                    market, venue, lat, lon, tz
+                )
+                fut = ex.submit(
+                    fetch_market_hourly,
+                    base_url, hourly_vars, start, end, lat, lon, tz, timeout,
+                    session=session,
+                )
+                futures[fut] = (i, market, venue)
+
+            for fut in as_completed(futures):
+                i, market, venue = futures[fut]
+                try:
+                    df = fut.result()
+                    df["market"] = market
+                    df["venue"] = venue
+                    results[i] = df
+                    logging.info("Fetched %d rows for %s", len(df), market)
+                except Exception as e:
+                    logging.exception("Failed for %s: %s", market, e)
+
+    # Keep the output in markets.yml order regardless of completion order.
+    frames = [results[i] for i in sorted(results)]
 
     if not frames:
         logging.error("No weather data fetched — exiting without writing CSV.")
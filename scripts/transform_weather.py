@@ -1,155 +1,445 @@
-# transform_weather.py
-from pathlib import Path
-import logging
-import pandas as pd
-import yaml
-from typing import Dict, Any
-import re
-
-def load_yaml(path: Path) -> Dict[str, Any]:
-    with open(path, "r", encoding="utf-8") as f:
-        return yaml.safe_load(f)
-
-def setup_logging(log_file: Path):
-    log_file.parent.mkdir(parents=True, exist_ok=True)
-    logging.basicConfig(
-        level=logging.INFO,
-        format="%(asctime)s | %(levelname)s | %(message)s",
-        handlers=[logging.FileHandler(log_file, encoding="utf-8"), logging.StreamHandler()],
-    )
-
-def slugify(*parts: str) -> str:
-    """Stable fallback key from text parts (lowercase alnum and underscores)."""
-    s = "_".join([p or "" for p in parts])
-    s = s.lower()
-    s = re.sub(r"[^a-z0-9]+", "_", s)
-    return s.strip("_")
-
-def build_markets_df(markets_cfg: Dict[str, Any]) -> pd.DataFrame:
-    """Create a normalization table with market, venue, venue_id, country."""
-    items = markets_cfg.get("markets", [])
-    rows = []
-    for it in items:
-        rows.append({
-            "market": str(it.get("market", "")).strip(),
-            "venue": str(it.get("venue", "")).strip(),
-            "venue_id": str(it.get("venue_id", "")).strip(),
-            "country": str(it.get("country", "")).strip(),
-        })
-    md = pd.DataFrame(rows)
-    # Drop empties if any
-    md = md[(md["market"] != "") & (md["venue"] != "")]
-    return md
-
-def main():
-    ROOT = Path(__file__).resolve().parents[1]
-    CONFIG_DIR = ROOT / "config"
-    CLEAN_DIR = ROOT / "data" / "cleaned"
-    LOG_FILE = ROOT / "logs" / "transform_weather.log"
-
-    setup_logging(LOG_FILE)
-
-    # Load settings & markets
-    settings = load_yaml(CONFIG_DIR / "settings.yml")
-    markets_cfg = load_yaml(CONFIG_DIR / "markets.yml")
-    markets_df = build_markets_df(markets_cfg)
-
-    w = settings["weather"]
-    raw_csv = ROOT / w["out_csv"]  # e.g., data/raw/weather/weather_hourly_2025-01_2025-02.csv
-    if not raw_csv.exists():
-        logging.error("Raw weather CSV not found: %s", raw_csv)
-        return
-
-    logging.info("Reading raw weather: %s", raw_csv)
-    df = pd.read_csv(raw_csv)
-
-    
-    required_min = {"time", "temperature_2m", "relative_humidity_2m", "wind_speed_10m", "precipitation", "market", "venue"}
-    missing_min = required_min.difference(df.columns)
-    if missing_min:
-        logging.error("Missing required columns: %s", ", ".join(sorted(missing_min)))
-        return
-
-    # Parsing time & event_date
-    df["time"] = pd.to_datetime(df["time"], errors="coerce")
-    df["event_date"] = df["time"].dt.date
-
-    # Renaming weather columns
-    df = df.rename(columns={
-        "temperature_2m": "temp_c",
-        "relative_humidity_2m": "rh_pct",
-        "wind_speed_10m": "wind_mps",
-        "precipitation": "precip_mm",
-    })
-
-    # Numeric coercion (convert to correct dtypes):
-    for c in ["temp_c", "rh_pct", "wind_mps", "precip_mm"]:
-        df[c] = pd.to_numeric(df[c], errors="coerce")
-
-    # --- Enrich with venue_id, country from markets.yml ---
-    pre_count = len(df)
-    df = df.merge(
-        markets_df,
-        how="left",
-        on=["market", "venue"],
-        validate="m:1"
-    )
-    matched = df["venue_id"].notna().sum()
-    logging.info("Enrichment: matched %d / %d rows to markets.yml", matched, pre_count)
-
-    # Fallbacks for any unmatched rows
-    df["venue_id"] = df["venue_id"].fillna(df.apply(lambda r: slugify(r["market"], r["venue"]), axis=1))
-    df["country"] = df["country"].fillna("")
-
-    # Reorder columns for readability
-    hourly_cols = ["time", "event_date", "market", "country", "venue_id", "venue",
-                   "temp_c", "rh_pct", "wind_mps", "precip_mm"]
-    df_hourly = df[hourly_cols].sort_values(["market", "venue_id", "time"]).reset_index(drop=True)
-
-    # Save hourly tidy
-    CLEAN_DIR.mkdir(parents=True, exist_ok=True)
-    hourly_out = CLEAN_DIR / "weather_hourly_tidy.csv"
-    df_hourly.to_csv(hourly_out, index=False)
-    logging.info("Saved hourly tidy: %s (%d rows)", hourly_out, len(df_hourly))
-
-    # Daily features by venue_id + date
-    windy_thresh = 8.0        # m/s (~18 mph)
-    rainy_thresh = 0.0        # >0mm counts as rainy hour
-    freezing_thresh = 0.0     # <=0°C
-
-    df_hourly["is_windy_hour"] = (df_hourly["wind_mps"] >= windy_thresh).astype("Int64")
-    df_hourly["is_rainy_hour"] = (df_hourly["precip_mm"] > rainy_thresh).astype("Int64")
-    df_hourly["is_freezing_hour"] = (df_hourly["temp_c"] <= freezing_thresh).astype("Int64")
-
-    daily = (
-        df_hourly
-        .groupby(["event_date", "market", "country", "venue_id", "venue"], as_index=False)
-        .agg(
-            avg_temp_c=("temp_c", "mean"),
-            min_temp_c=("temp_c", "min"),
-            max_temp_c=("temp_c", "max"),
-            avg_rh_pct=("rh_pct", "mean"),
-            avg_wind_mps=("wind_mps", "mean"),
-            total_precip_mm=("precip_mm", "sum"),
-            windy_hours=("is_windy_hour", "sum"),
-            rainy_hours=("is_rainy_hour", "sum"),
-            freezing_hours=("is_freezing_hour", "sum"),
-            hours_observed=("time", "count"),
-        )
-    )
-
-    float_cols = ["avg_temp_c", "min_temp_c", "max_temp_c", "avg_rh_pct", "avg_wind_mps", "total_precip_mm"]
-    daily[float_cols] = daily[float_cols].round(2)
-
-    daily_out = CLEAN_DIR / "weather_daily_by_venue.csv"
-    daily.to_csv(daily_out, index=False)
-    logging.info("Saved daily features: %s (%d rows)", daily_out, len(daily))
-
-    logging.info("transform_weather complete.")
-
-if __name__ == "__main__":
-    main()
-
-# run code:
-
-# python scripts/transform_weather.py
+# transform_weather.py
+from pathlib import Path
+import functools
+import logging
+from logging.handlers import RotatingFileHandler, MemoryHandler
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from pyarrow import csv as pacsv
+import yaml
+from typing import Dict, Any
+import re
+
+from _paths import ROOT, CONFIG_DIR, CLEAN_DIR, LOGS_DIR
+
+try:
+    import numexpr as ne  # optional: threaded comparison loops for the hour flags
+except ImportError:
+    ne = None
+
+# Daily feature thresholds
+WINDY_THRESH = 8.0        # m/s (~18 mph)
+RAINY_THRESH = 0.0        # >0mm counts as rainy hour
+FREEZING_THRESH = 0.0     # <=0°C
+
+REQUIRED_MIN = {"time", "temperature_2m", "relative_humidity_2m", "wind_speed_10m", "precipitation", "market", "venue"}
+
+RENAME_MAP = {
+    "temperature_2m": "temp_c",
+    "relative_humidity_2m": "rh_pct",
+    "wind_speed_10m": "wind_mps",
+    "precipitation": "precip_mm",
+}
+
+HOURLY_COLS = ["time", "event_date", "market", "country", "venue_id", "venue",
+               "temp_c", "rh_pct", "wind_mps", "precip_mm"]
+
+AGG_KEYS = ["event_date", "market", "country", "venue_id", "venue"]
+
+# Explicit Arrow column types: `time` arrives as a timestamp and the metrics
+# as float32, so frames need no to_datetime/to_numeric re-coercion pass.
+# Open-Meteo emits ISO timestamps, which Arrow's timestamp parser handles
+# natively.
+_WEATHER_CONVERT_OPTS = pacsv.ConvertOptions(
+    column_types={
+        "time": pa.timestamp("s"),
+        "temperature_2m": pa.float32(),
+        "relative_humidity_2m": pa.float32(),
+        "wind_speed_10m": pa.float32(),
+        "precipitation": pa.float32(),
+        "market": pa.string(),
+        "venue": pa.string(),
+    },
+    null_values=["", "NaN", "nan"],
+)
+
+try:
+    from yaml import CSafeLoader as _YamlLoader  # LibYAML C bindings when built
+except ImportError:
+    from yaml import SafeLoader as _YamlLoader
+
+@functools.lru_cache(maxsize=8)
+def _load_yaml_cached(path_str: str, mtime: float) -> Dict[str, Any]:
+    with open(path_str, "r", encoding="utf-8") as f:
+        return yaml.load(f, Loader=_YamlLoader)
+
+def load_yaml(path: Path) -> Dict[str, Any]:
+    # Keyed on path + mtime so repeat loads in one pipeline run hit the cache
+    # but edits to the file still invalidate it.
+    return _load_yaml_cached(str(path), path.stat().st_mtime)
+
+def setup_logging(log_file: Path):
+    log_file.parent.mkdir(parents=True, exist_ok=True)
+    # The rotating file handler opens lazily (delay=True) and sits behind a
+    # MemoryHandler, so INFO records flush to disk in batches instead of per
+    # record; errors flush immediately.
+    file_handler = RotatingFileHandler(
+        log_file, maxBytes=5_000_000, backupCount=3, encoding="utf-8", delay=True
+    )
+    file_handler.setFormatter(logging.Formatter("%(asctime)s | %(levelname)s | %(message)s"))
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s | %(levelname)s | %(message)s",
+        force=True,
+        handlers=[
+            MemoryHandler(1024, flushLevel=logging.ERROR, target=file_handler),
+            logging.StreamHandler(),
+        ],
+    )
+
+# Compiled once at import; the bulk fallback path in _tidy_chunk uses the
+# same pattern through the vectorized string accessors.
+_SLUG_RE = re.compile(r"[^a-z0-9]+")
+
+def slugify(*parts: str) -> str:
+    """Stable fallback key from text parts (lowercase alnum and underscores)."""
+    s = "_".join(p or "" for p in parts).lower()
+    return _SLUG_RE.sub("_", s).strip("_")
+
+def build_markets_df(markets_cfg: Dict[str, Any]) -> pd.DataFrame:
+    """Create a normalization table with market, venue, venue_id, country."""
+    items = markets_cfg.get("markets", [])
+    cols = ["market", "venue", "venue_id", "country"]
+    # One constructor call over the YAML records, then column-wise vectorized
+    # cleanup — no per-entry dict building or per-value Python strip.
+    md = pd.DataFrame.from_records(
+        [{c: it.get(c, "") for c in cols} for it in items], columns=cols
+    ).astype(str)
+    md = md.apply(lambda s: s.str.strip())
+    # Drop empties if any
+    md = md[(md["market"] != "") & (md["venue"] != "")].reset_index(drop=True)
+    return md
+
+def _tidy_chunk(df: pd.DataFrame, markets_df: pd.DataFrame):
+    """Rename, enrich and flag one frame of raw hourly rows.
+
+    Shared by the whole-file path and the streaming path, so it must not
+    assume it sees all rows at once. Returns (tidy_df, n_matched).
+    """
+    # event_date from the already-typed timestamp column. Floor to day as
+    # datetime64 rather than .dt.date: date objects are one Python object per
+    # row and force the daily groupby onto the object-hashing path, while a
+    # datetime64 key stays a native 8-byte integer.
+    df["event_date"] = df["time"].to_numpy().astype("datetime64[D]")
+
+    df = df.rename(columns=RENAME_MAP)
+
+    # market/venue are a handful of distinct strings repeated for every hour;
+    # as categories the enrichment and groupby below compare small integer
+    # codes instead of hashing full strings, and the frame shrinks accordingly.
+    for c in ("market", "venue"):
+        df[c] = df[c].astype("category")
+
+    # --- Enrich with venue_id, country from markets.yml ---
+    # markets_df is a handful of rows, so a full hash merge (plus its m:1
+    # duplicate scan) is overkill. With market/venue categorical, the pair
+    # (market_code, venue_code) is a small integer, and enrichment reduces to
+    # numpy advanced indexing into two tiny lookup arrays — no join plan, no
+    # per-row string hashing.
+    n_venues = len(df["venue"].cat.categories)
+    mk_m = markets_df["market"].astype(df["market"].dtype).cat.codes.to_numpy()
+    mk_v = markets_df["venue"].astype(df["venue"].dtype).cat.codes.to_numpy()
+    mk_known = (mk_m >= 0) & (mk_v >= 0)  # config rows absent from this frame
+    slot = np.full(len(df["market"].cat.categories) * n_venues, -1, dtype=np.int64)
+    slot[mk_m[mk_known] * n_venues + mk_v[mk_known]] = np.flatnonzero(mk_known)
+
+    m_codes = df["market"].cat.codes.to_numpy()
+    v_codes = df["venue"].cat.codes.to_numpy()
+    row_known = (m_codes >= 0) & (v_codes >= 0)
+    idx = np.full(len(df), -1, dtype=np.int64)
+    idx[row_known] = slot[m_codes[row_known].astype(np.int64) * n_venues + v_codes[row_known]]
+
+    vid = markets_df["venue_id"].to_numpy(dtype=object)
+    ctry = markets_df["country"].to_numpy(dtype=object)
+    matched_mask = idx >= 0
+    df["venue_id"] = np.where(matched_mask, vid[idx], None)
+    df["country"] = np.where(matched_mask, ctry[idx], None)
+
+    # Fallbacks for any unmatched rows. Slug only the NaN subset with the
+    # vectorized string accessors — a per-row apply would compute a slug
+    # for every row even when all of them matched.
+    mask = df["venue_id"].isna()
+    if mask.any():
+        combo = (df.loc[mask, "market"].astype(object).fillna("") + "_"
+                 + df.loc[mask, "venue"].astype(object).fillna("")).str.lower()
+        df.loc[mask, "venue_id"] = combo.str.replace(r"[^a-z0-9]+", "_", regex=True).str.strip("_")
+    df["country"] = df["country"].fillna("")
+
+    # Cast the enriched keys to category too, once the fallback fill is done.
+    for c in ("venue_id", "country"):
+        df[c] = df[c].astype("category")
+
+    # Plain bool flags (1 byte/row): summed as ints in the daily agg, and
+    # nullable Int64 cost 9 bytes/row on a slower masked path. With numexpr
+    # installed, each comparison runs in its blocked multi-threaded VM over
+    # the contiguous float32 arrays; otherwise plain numpy comparisons.
+    if ne is not None:
+        wind = df["wind_mps"].to_numpy()
+        precip = df["precip_mm"].to_numpy()
+        temp = df["temp_c"].to_numpy()
+        df["is_windy_hour"] = ne.evaluate("wind >= thresh", local_dict={"wind": wind, "thresh": WINDY_THRESH})
+        df["is_rainy_hour"] = ne.evaluate("precip > thresh", local_dict={"precip": precip, "thresh": RAINY_THRESH})
+        df["is_freezing_hour"] = ne.evaluate("temp <= thresh", local_dict={"temp": temp, "thresh": FREEZING_THRESH})
+    else:
+        df["is_windy_hour"] = df["wind_mps"] >= WINDY_THRESH
+        df["is_rainy_hour"] = df["precip_mm"] > RAINY_THRESH
+        df["is_freezing_hour"] = df["temp_c"] <= FREEZING_THRESH
+
+    return df, int(matched_mask.sum())
+
+def _stream_transform(raw_csv: Path, markets_df: pd.DataFrame, hourly_out: Path):
+    """Record-batch streaming path for raw files too large to hold in RAM.
+
+    Each Arrow batch is tidied, appended to the hourly parquet, and folded
+    into per-batch partial aggregates; the partials are combined into the
+    daily frame at the end. Peak memory is O(batch) + O(#groups) instead of
+    O(file). The hourly file keeps input order rather than the sorted order
+    of the in-memory path. Returns (daily, n_rows, n_matched) or None.
+    """
+    # Memory-map the source: the parser reads straight out of the page cache
+    # with no userspace buffer copies.
+    source = pa.memory_map(str(raw_csv), "r")
+    reader = pacsv.open_csv(
+        source,
+        read_options=pacsv.ReadOptions(use_threads=True, block_size=16 << 20),
+        convert_options=_WEATHER_CONVERT_OPTS,
+    )
+    key_str_cols = ("market", "venue", "venue_id", "country")
+    metric_cols = ["temp_c", "rh_pct", "wind_mps", "precip_mm",
+                   "is_windy_hour", "is_rainy_hour", "is_freezing_hour", "time"]
+    writer = None
+    partials = []
+    rows = 0
+    matched = 0
+    try:
+        for batch in reader:
+            chunk = batch.to_pandas()
+            if writer is None:
+                missing = REQUIRED_MIN.difference(chunk.columns)
+                if missing:
+                    logging.error("Missing required columns: %s", ", ".join(sorted(missing)))
+                    return None
+            chunk, m = _tidy_chunk(chunk, markets_df)
+            rows += len(chunk)
+            matched += m
+
+            # Plain strings for the key columns: each batch grows its own
+            # categorical dictionary, which would not fit one parquet schema.
+            prepped = chunk.assign(
+                is_windy_hour=chunk["is_windy_hour"].astype("int8"),
+                is_rainy_hour=chunk["is_rainy_hour"].astype("int8"),
+                is_freezing_hour=chunk["is_freezing_hour"].astype("int8"),
+                **{c: chunk[c].astype(str) for c in key_str_cols},
+            )
+
+            tbl = pa.Table.from_pandas(prepped[HOURLY_COLS], preserve_index=False)
+            if writer is None:
+                writer = pq.ParquetWriter(hourly_out, tbl.schema, compression="zstd")
+            writer.write_table(tbl)
+
+            # Partial daily aggregates for this batch: decomposable pieces
+            # only (sums/mins/maxes/counts); means are derived after combine.
+            part = (
+                pa.Table.from_pandas(prepped[AGG_KEYS + metric_cols], preserve_index=False)
+                .group_by(AGG_KEYS)
+                .aggregate([
+                    ("temp_c", "sum"), ("temp_c", "min"), ("temp_c", "max"), ("temp_c", "count"),
+                    ("rh_pct", "sum"), ("rh_pct", "count"),
+                    ("wind_mps", "sum"), ("wind_mps", "count"),
+                    ("precip_mm", "sum"),
+                    ("is_windy_hour", "sum"), ("is_rainy_hour", "sum"), ("is_freezing_hour", "sum"),
+                    ("time", "count"),
+                ])
+                .to_pandas()
+            )
+            partials.append(part)
+    finally:
+        if writer is not None:
+            writer.close()
+        source.close()
+
+    if writer is None:
+        logging.error("No rows read from %s; nothing written.", raw_csv)
+        return None
+
+    # Combine the per-batch partials: sums and counts add, mins/maxes fold.
+    comb = pa.Table.from_pandas(pd.concat(partials, ignore_index=True), preserve_index=False)
+    tot = (
+        comb.group_by(AGG_KEYS)
+        .aggregate([
+            ("temp_c_sum", "sum"), ("temp_c_min", "min"), ("temp_c_max", "max"), ("temp_c_count", "sum"),
+            ("rh_pct_sum", "sum"), ("rh_pct_count", "sum"),
+            ("wind_mps_sum", "sum"), ("wind_mps_count", "sum"),
+            ("precip_mm_sum", "sum"),
+            ("is_windy_hour_sum", "sum"), ("is_rainy_hour_sum", "sum"), ("is_freezing_hour_sum", "sum"),
+            ("time_count", "sum"),
+        ])
+        .to_pandas()
+    )
+
+    daily = tot[AGG_KEYS].copy()
+    daily["avg_temp_c"] = tot["temp_c_sum_sum"] / tot["temp_c_count_sum"]
+    daily["min_temp_c"] = tot["temp_c_min_min"]
+    daily["max_temp_c"] = tot["temp_c_max_max"]
+    daily["avg_rh_pct"] = tot["rh_pct_sum_sum"] / tot["rh_pct_count_sum"]
+    daily["avg_wind_mps"] = tot["wind_mps_sum_sum"] / tot["wind_mps_count_sum"]
+    daily["total_precip_mm"] = tot["precip_mm_sum_sum"]
+    daily["windy_hours"] = tot["is_windy_hour_sum_sum"]
+    daily["rainy_hours"] = tot["is_rainy_hour_sum_sum"]
+    daily["freezing_hours"] = tot["is_freezing_hour_sum_sum"]
+    daily["hours_observed"] = tot["time_count_sum"]
+    return daily, rows, matched
+
+def main():
+    LOG_FILE = LOGS_DIR / "transform_weather.log"
+
+    setup_logging(LOG_FILE)
+
+    # Load settings & markets
+    settings = load_yaml(CONFIG_DIR / "settings.yml")
+    markets_cfg = load_yaml(CONFIG_DIR / "markets.yml")
+    markets_df = build_markets_df(markets_cfg)
+
+    w = settings["weather"]
+    raw_csv = ROOT / w["out_csv"]  # e.g., data/raw/weather/weather_hourly_2025-01_2025-02.csv
+    if not raw_csv.exists():
+        logging.error("Raw weather CSV not found: %s", raw_csv)
+        return
+
+    out_format = str(w.get("out_format", "parquet")).lower()
+    CLEAN_DIR.mkdir(parents=True, exist_ok=True)
+
+    # Inputs past this size are streamed batch-by-batch instead of loaded
+    # whole (weather.stream_threshold_bytes in settings.yml to tune).
+    stream_threshold = int(w.get("stream_threshold_bytes", 256 << 20))
+
+    if raw_csv.stat().st_size >= stream_threshold:
+        logging.info("Reading raw weather (streaming): %s", raw_csv)
+        hourly_out = CLEAN_DIR / "weather_hourly_tidy.parquet"
+        if out_format != "parquet":
+            logging.info("Streaming mode writes the hourly output as parquet regardless of out_format.")
+        result = _stream_transform(raw_csv, markets_df, hourly_out)
+        if result is None:
+            return
+        daily, n_rows, matched = result
+        logging.info("Enrichment: matched %d / %d rows to markets.yml", matched, n_rows)
+        logging.info("Saved hourly tidy: %s (%d rows)", hourly_out, n_rows)
+    else:
+        logging.info("Reading raw weather: %s", raw_csv)
+        read_opts = pacsv.ReadOptions(use_threads=True, block_size=1 << 20)
+        # Memory-map the source: the parser reads straight out of the page
+        # cache with no userspace buffer copies.
+        with pa.memory_map(str(raw_csv), "r") as source:
+            table = pacsv.read_csv(source, read_options=read_opts, convert_options=_WEATHER_CONVERT_OPTS)
+        df = table.to_pandas()
+
+        missing_min = REQUIRED_MIN.difference(df.columns)
+        if missing_min:
+            logging.error("Missing required columns: %s", ", ".join(sorted(missing_min)))
+            return
+
+        pre_count = len(df)
+        df, matched = _tidy_chunk(df, markets_df)
+        logging.info("Enrichment: matched %d / %d rows to markets.yml", matched, pre_count)
+
+        # Reorder columns for readability. Only the hourly view gets sorted —
+        # the daily aggregation below is a hash pass over the unsorted frame,
+        # so sorting df first would be a wasted O(N log N) on a different key.
+        df_hourly = df[HOURLY_COLS].sort_values(["market", "venue_id", "time"], kind="stable").reset_index(drop=True)
+
+        # Save hourly tidy. Parquet by default: columnar, zstd-compressed,
+        # with dictionary encoding on the repeated venue/market strings —
+        # both smaller on disk and far cheaper to write/read than row-at-a-
+        # time to_csv. CSV stays available via settings (weather.out_format:
+        # "csv"), written with Arrow's threaded CSV writer.
+        if out_format == "parquet":
+            hourly_out = CLEAN_DIR / "weather_hourly_tidy.parquet"
+            pq.write_table(
+                pa.Table.from_pandas(df_hourly, preserve_index=False),
+                hourly_out,
+                compression="zstd",
+                use_dictionary=["market", "venue", "venue_id", "country"],
+            )
+        else:
+            hourly_out = CLEAN_DIR / "weather_hourly_tidy.csv"
+            # Format the date key only at the serialization boundary so the
+            # in-memory column stays datetime64 for the daily groupby below.
+            pacsv.write_csv(
+                pa.Table.from_pandas(
+                    df_hourly.assign(event_date=df_hourly["event_date"].dt.strftime("%Y-%m-%d")),
+                    preserve_index=False,
+                ),
+                hourly_out,
+            )
+        logging.info("Saved hourly tidy: %s (%d rows)", hourly_out, len(df_hourly))
+
+        # All ten reductions run as one fused Arrow hash aggregation: a
+        # single multi-threaded pass over the group keys instead of pandas
+        # dispatching each aggregation separately. Bool flags are cast to
+        # int8 for Arrow's sum kernel.
+        agg_tbl = pa.Table.from_pandas(
+            df.assign(
+                is_windy_hour=df["is_windy_hour"].astype("int8"),
+                is_rainy_hour=df["is_rainy_hour"].astype("int8"),
+                is_freezing_hour=df["is_freezing_hour"].astype("int8"),
+            )[AGG_KEYS + ["temp_c", "rh_pct", "wind_mps", "precip_mm",
+                          "is_windy_hour", "is_rainy_hour", "is_freezing_hour", "time"]],
+            preserve_index=False,
+        )
+        daily = (
+            agg_tbl.group_by(AGG_KEYS)
+            .aggregate([
+                ("temp_c", "mean"), ("temp_c", "min"), ("temp_c", "max"),
+                ("rh_pct", "mean"), ("wind_mps", "mean"), ("precip_mm", "sum"),
+                ("is_windy_hour", "sum"), ("is_rainy_hour", "sum"), ("is_freezing_hour", "sum"),
+                ("time", "count"),
+            ])
+            .to_pandas()
+            .rename(columns={
+                "temp_c_mean": "avg_temp_c", "temp_c_min": "min_temp_c", "temp_c_max": "max_temp_c",
+                "rh_pct_mean": "avg_rh_pct", "wind_mps_mean": "avg_wind_mps",
+                "precip_mm_sum": "total_precip_mm",
+                "is_windy_hour_sum": "windy_hours", "is_rainy_hour_sum": "rainy_hours",
+                "is_freezing_hour_sum": "freezing_hours", "time_count": "hours_observed",
+            })
+        )
+
+    daily = daily[AGG_KEYS + ["avg_temp_c", "min_temp_c", "max_temp_c", "avg_rh_pct",
+                              "avg_wind_mps", "total_precip_mm", "windy_hours",
+                              "rainy_hours", "freezing_hours", "hours_observed"]]
+    # Hash-agg output order is arbitrary; sorting the small daily frame keeps
+    # the file deterministic at negligible cost (#venues x #days rows).
+    daily = daily.sort_values(AGG_KEYS, kind="stable").reset_index(drop=True)
+
+    # The metrics carry two decimals of real precision (rounded below) and a
+    # venue observes at most ~9k hours/year, so float32/int32 are plenty —
+    # half the bytes of the float64/int64 the aggregation hands back.
+    float_cols = ["avg_temp_c", "min_temp_c", "max_temp_c", "avg_rh_pct", "avg_wind_mps", "total_precip_mm"]
+    count_cols = ["windy_hours", "rainy_hours", "freezing_hours", "hours_observed"]
+    daily[float_cols] = daily[float_cols].round(2).astype("float32")
+    daily[count_cols] = daily[count_cols].astype("int32")
+
+    if out_format == "parquet":
+        daily_out = CLEAN_DIR / "weather_daily_by_venue.parquet"
+        pq.write_table(
+            pa.Table.from_pandas(daily, preserve_index=False),
+            daily_out,
+            compression="zstd",
+            use_dictionary=["market", "venue", "venue_id", "country"],
+        )
+    else:
+        daily_out = CLEAN_DIR / "weather_daily_by_venue.csv"
+        daily["event_date"] = daily["event_date"].dt.strftime("%Y-%m-%d")
+        pacsv.write_csv(pa.Table.from_pandas(daily, preserve_index=False), daily_out)
+    logging.info("Saved daily features: %s (%d rows)", daily_out, len(daily))
+
+    logging.info("transform_weather complete.")
+
+if __name__ == "__main__":
+    main()
+
+# run code:
+
+# python scripts/transform_weather.py